@@ -1,20 +1,27 @@
 import os
+import re
+import sys
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
 import aiohttp
 import asyncio
 import yt_dlp
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 import logging
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 import json
 from dataclasses import dataclass, asdict
 import time
+import threading
 from concurrent.futures import ThreadPoolExecutor
 import weakref
+from array import array
+from bisect import bisect_left
 from dotenv import load_dotenv
 
+STARTUP_TIME = time.perf_counter()
+
 # Load environment variables
 load_dotenv()
 
@@ -49,6 +56,11 @@ if missing_vars:
 
 logger.info("All environment variables loaded successfully from .env file")
 
+# Lean gateway mode: no member chunking at startup and only voice members cached
+LEAN_GATEWAY = os.getenv("LEAN_GATEWAY", "false").lower() in ("1", "true", "yes")
+# Seconds to collect joins/leaves into one digest per guild (0 = announce each one)
+MEMBER_DIGEST_WINDOW = float(os.getenv("MEMBER_DIGEST_WINDOW", "30" if LEAN_GATEWAY else "0"))
+
 # Vietnam cities for weather (comprehensive list)
 VIETNAM_CITIES = [
     "Ho Chi Minh City", "Hanoi", "Da Nang", "Can Tho", "Hai Phong",
@@ -59,6 +71,118 @@ VIETNAM_CITIES = [
     "Cao Lanh", "Sa Dec", "Vinh Long", "Ben Tre", "Dong Thap"
 ]
 
+def estimate_size(value) -> int:
+    """Approximate deep size of a cached value in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += estimate_size(vars(value))
+    return size
+
+class BoundedCache:
+    """LRU cache with a TTL and a byte budget, evicting on insert"""
+    
+    def __init__(self, name: str, max_bytes: int, ttl: Optional[float] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, expires_at, size), least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        
+        value, expires_at, _ = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Store a value; ``ttl`` overrides the namespace TTL for this entry"""
+        ttl = ttl or self.ttl
+        size = estimate_size(key) + estimate_size(value)
+        if key in self.entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        
+        now = time.monotonic()
+        self.entries[key] = (value, now + ttl if ttl else None, size)
+        self.bytes += size
+        
+        # Expired entries at the cold end go first, then least recently used ones
+        while self.entries:
+            oldest_key, (_, expires_at, _) = next(iter(self.entries.items()))
+            if expires_at is not None and expires_at <= now:
+                self._remove(oldest_key)
+                self.expirations += 1
+            elif self.bytes > self.max_bytes:
+                self._remove(oldest_key)
+                self.evictions += 1
+            else:
+                break
+    
+    def __contains__(self, key) -> bool:
+        """Whether a live entry exists, without touching recency or stats"""
+        entry = self.entries.get(key)
+        return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+    
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+    
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+class CacheStore:
+    """Named cache namespaces, each with its own byte budget"""
+    
+    def __init__(self):
+        self.namespaces: Dict[str, BoundedCache] = {}
+    
+    def namespace(self, name: str, max_bytes: int, ttl: Optional[float] = None) -> BoundedCache:
+        cache = BoundedCache(name, max_bytes, ttl)
+        self.namespaces[name] = cache
+        return cache
+    
+    def stats(self) -> Dict[str, dict]:
+        return {name: cache.stats() for name, cache in self.namespaces.items()}
+
+cache_store = CacheStore()
+
 @dataclass
 class Song:
     title: str
@@ -82,6 +206,82 @@ class WeatherData:
     wind_speed: float
     icon: str
 
+@dataclass
+class DailyForecast:
+    date: str
+    weekday: int
+    temp_min: float
+    temp_max: float
+    temp_mean: float
+    rain_probability: int
+    icon: str
+
+@dataclass
+class ForecastSeries:
+    """5-day/3-hour forecast for one city, stored as parallel typed arrays"""
+    city: str
+    timezone: int
+    timestamps: array
+    temperatures: array
+    rain_probability: array
+    icons: str  # 3-character OpenWeather icon codes, concatenated
+    
+    @classmethod
+    def from_api(cls, data: dict) -> 'ForecastSeries':
+        points = data['list']
+        return cls(
+            city=data['city']['name'],
+            timezone=data['city'].get('timezone', 0),
+            timestamps=array('q', (point['dt'] for point in points)),
+            temperatures=array('f', (point['main']['temp'] for point in points)),
+            rain_probability=array('f', (point.get('pop', 0) for point in points)),
+            icons="".join(point['weather'][0]['icon'][:3].ljust(3) for point in points)
+        )
+    
+    def daily_summary(self) -> List[DailyForecast]:
+        """Min/max/mean temperature and rain chance per local day.
+        
+        Points are sorted by time, so each day is a contiguous slice found by
+        bisecting the timestamps at midnight; the work per day runs on array
+        slices with the C builtins and nothing is done per point in Python.
+        """
+        days = []
+        if not self.timestamps:
+            return days
+        
+        first_day = (self.timestamps[0] + self.timezone) // 86400
+        last_day = (self.timestamps[-1] + self.timezone) // 86400
+        start = 0
+        for day in range(first_day, last_day + 1):
+            end = bisect_left(self.timestamps, (day + 1) * 86400 - self.timezone, start)
+            if end == start:
+                continue  # no points that day
+            temps = self.temperatures[start:end]
+            
+            # Prefer a daytime icon for the day
+            icons = self.icons[start * 3:end * 3]
+            daytime = icons.find('d')
+            icon = icons[daytime - 2:daytime + 1] if daytime >= 2 else icons[:3]
+            
+            days.append(self._day(
+                day, min(temps), max(temps), sum(temps) / len(temps),
+                max(self.rain_probability[start:end]), icon
+            ))
+            start = end
+        return days
+    
+    def _day(self, day, low, high, mean, rain, icon) -> DailyForecast:
+        date = time.gmtime(day * 86400)
+        return DailyForecast(
+            date=f"{date.tm_mday:02d}/{date.tm_mon:02d}",
+            weekday=date.tm_wday,
+            temp_min=round(low, 1),
+            temp_max=round(high, 1),
+            temp_mean=round(mean, 1),
+            rain_probability=round(rain * 100),
+            icon=icon
+        )
+
 class OptimizedQueue:
     """Thread-safe optimized queue implementation"""
     def __init__(self):
@@ -116,6 +316,170 @@ class OptimizedQueue:
     def __len__(self):
         return len(self._queue)
 
+class SharedStream:
+    """One ffmpeg Opus encode of a track, buffering only the frames a listener still needs.
+    
+    While the join window is open every frame since the start is kept, so a
+    guild starting the track late can still hear it from the beginning. After
+    that the buffer shrinks to the lag of the slowest listener, capped at
+    ``max_lag_frames``.
+    """
+    
+    def __init__(self, url: str, ffmpeg_options: dict, join_frames: int, max_lag_frames: int):
+        self.source = discord.FFmpegOpusAudio(url, **ffmpeg_options)
+        self.join_frames = join_frames
+        self.max_lag_frames = max_lag_frames
+        self.frames = deque()
+        self.base = 0  # frame number of frames[0]
+        self.produced = 0  # frames read from ffmpeg so far
+        self.finished = False
+        self.positions = {}  # listener token -> next frame it will read
+        self.lock = threading.Lock()  # guards the buffer, held only briefly
+        self.producer_lock = threading.Lock()  # one ffmpeg read at a time
+    
+    def can_join(self) -> bool:
+        # A new listener starts at the beginning, so it must still be buffered
+        return self.base == 0 and self.produced < self.join_frames
+    
+    def subscribe(self, token):
+        with self.lock:
+            self.positions[token] = 0
+    
+    def unsubscribe(self, token) -> int:
+        with self.lock:
+            self.positions.pop(token, None)
+            self._trim()
+            return len(self.positions)
+    
+    def buffered_bytes(self) -> int:
+        with self.lock:
+            return sum(sys.getsizeof(frame) for frame in self.frames)
+    
+    def _trim(self):
+        if self.produced < self.join_frames and self.base == 0:
+            keep_from = 0
+        else:
+            keep_from = min(self.positions.values(), default=self.produced)
+        keep_from = max(keep_from, self.produced - self.max_lag_frames)
+        while self.base < keep_from and self.frames:
+            self.frames.popleft()
+            self.base += 1
+    
+    def _buffered(self, index: int) -> Optional[bytes]:
+        if index >= self.produced:
+            return b''
+        if index < self.base:
+            return None
+        return self.frames[index - self.base]
+    
+    def frame(self, token, index: int) -> Optional[bytes]:
+        """Frame number ``index``, b'' once the track ends, None if no longer buffered"""
+        with self.lock:
+            self.positions[token] = index
+            if index < self.produced or self.finished:
+                return self._buffered(index)
+        
+        # Whichever listener is furthest ahead pulls the next frame from ffmpeg.
+        # Listeners behind it keep reading the buffer while ffmpeg stalls.
+        with self.producer_lock:
+            while True:
+                with self.lock:
+                    if index < self.produced or self.finished:
+                        return self._buffered(index)
+                
+                data = self.source.read()
+                with self.lock:
+                    if not data:
+                        self.finished = True
+                    else:
+                        self.frames.append(data)
+                        self.produced += 1
+                        self._trim()
+    
+    def close(self):
+        self.source.cleanup()
+
+class SharedAudioSource(discord.AudioSource):
+    """One guild's read position in a SharedStream"""
+    
+    def __init__(self, pool, key, stream: SharedStream, url: str, ffmpeg_options: dict):
+        self.pool = pool
+        self.key = key
+        self.stream = stream
+        self.url = url
+        self.ffmpeg_options = ffmpeg_options
+        self.position = 0
+        self.private_source = None
+    
+    def read(self) -> bytes:
+        if self.private_source:
+            return self.private_source.read()
+        
+        data = self.stream.frame(self, self.position)
+        if data is None:
+            # Fell further behind than the buffer (e.g. paused): continue on our own stream
+            self.private_source = self.pool.open_private(self.url, self.ffmpeg_options, self.position)
+            self.release_stream()
+            return self.private_source.read()
+        
+        self.position += 1
+        return data
+    
+    def is_opus(self) -> bool:
+        return True
+    
+    def release_stream(self):
+        if self.stream:
+            self.pool.release(self.key, self.stream, self)
+            self.stream = None
+    
+    def cleanup(self):
+        self.release_stream()
+        if self.private_source:
+            self.private_source.cleanup()
+            self.private_source = None
+
+class SharedStreamPool:
+    """Shares one ffmpeg Opus encode per (track, filter) between every guild playing it"""
+    
+    def __init__(self, join_seconds: float = 10, max_lag_seconds: float = 30):
+        frame_length = discord.opus.Encoder.FRAME_LENGTH
+        self.join_frames = int(join_seconds * 1000 / frame_length)
+        self.max_lag_frames = int(max_lag_seconds * 1000 / frame_length)
+        self.streams = {}
+        self.lock = threading.Lock()
+    
+    def open(self, track: str, url: str, ffmpeg_options: dict) -> SharedAudioSource:
+        key = (track, ffmpeg_options.get('before_options'), ffmpeg_options.get('options'))
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None or not stream.can_join():
+                stream = SharedStream(url, ffmpeg_options, self.join_frames, self.max_lag_frames)
+                self.streams[key] = stream
+            source = SharedAudioSource(self, key, stream, url, ffmpeg_options)
+            stream.subscribe(source)
+        return source
+    
+    def open_private(self, url: str, ffmpeg_options: dict, position: int):
+        # Seek straight to where the listener left the shared stream
+        seconds = position * discord.opus.Encoder.FRAME_LENGTH / 1000
+        options = dict(ffmpeg_options)
+        options['before_options'] = f"-ss {seconds:.2f} {options.get('before_options', '')}".strip()
+        return discord.FFmpegOpusAudio(url, **options)
+    
+    def release(self, key, stream: SharedStream, token):
+        with self.lock:
+            if stream.unsubscribe(token) > 0:
+                return
+            if self.streams.get(key) is stream:
+                del self.streams[key]
+        stream.close()
+    
+    def buffered_bytes(self) -> int:
+        with self.lock:
+            streams = list(self.streams.values())
+        return sum(stream.buffered_bytes() for stream in streams)
+
 class MusicPlayer:
     """Enhanced music player with caching and optimization"""
     
@@ -128,10 +492,40 @@ class MusicPlayer:
             'volume': 0.5,
             'loop': False,
             'shuffle': False,
-            'auto_disconnect_task': None
+            'auto_disconnect_task': None,
+            'now_playing_message': None,
+            'now_playing_task': None,
+            'starting': False
         })
         self.executor = ThreadPoolExecutor(max_workers=4)
-        self.ydl_cache = {}
+        # Stream URLs from YouTube expire after about 6 hours
+        self.ydl_cache = cache_store.namespace('songs', max_bytes=8 * 1024 * 1024, ttl=3 * 3600)
+        
+        # Measured (integrated loudness LUFS, sample peak dBFS) per track; unlike
+        # stream URLs these never go stale, so they outlive the song entries
+        self.loudness_cache = cache_store.namespace('loudness', max_bytes=512 * 1024)
+        self.loudness_target = -18.0  # LUFS
+        self.loudness_analysis_seconds = 600
+        self.loudness_tasks = {}
+        self.loudness_running = set()  # keys whose measurement holds a semaphore slot
+        self.loudness_semaphore = asyncio.Semaphore(2)
+        self.loudness_wait_seconds = 0.5  # how long a track may wait for its measurement
+        self.loudness_retry_seconds = 6 * 3600  # failed measurements are retried after this
+        self.loudness_enabled = True
+        self.stream_pool = SharedStreamPool()
+        
+        # Flat search results keyed by normalized query, for autocomplete and /search
+        self.search_cache = cache_store.namespace('searches', max_bytes=2 * 1024 * 1024, ttl=900)
+        # Own workers, so keystrokes never queue behind full extractions for /play
+        self.search_executor = ThreadPoolExecutor(max_workers=4)
+        self.inflight_searches = {}  # cache key -> task fetching it
+        self.pending_searches = {}
+        self.autocomplete_delay = 0.3  # wait for the user to stop typing
+        
+        # One now-playing panel per guild, edited in place; changes within
+        # this window are folded into a single edit
+        self.now_playing_delay = 1.5
+        self.now_playing_view = None
         
         # Enhanced yt-dlp options
         self.ydl_options = {
@@ -151,6 +545,13 @@ class MusicPlayer:
             'socket_timeout': 30,
         }
         
+        # Flat search only lists entries, no format or signature resolution
+        self.flat_ydl_options = {
+            **self.ydl_options,
+            'extract_flat': True,
+            'noplaylist': False,
+        }
+        
         self.ffmpeg_options = {
             'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
             'options': '-vn -filter:a "volume=0.5" -bufsize 512k'
@@ -160,10 +561,9 @@ class MusicPlayer:
         """Optimized song search with caching"""
         cache_key = f"search_{hash(query)}"
         
-        if cache_key in self.ydl_cache:
-            cached_result = self.ydl_cache[cache_key]
-            cached_result['requester'] = requester
-            return Song(**cached_result)
+        cached_result = self.ydl_cache.get(cache_key)
+        if cached_result:
+            return Song(**cached_result, requester=requester)
         
         try:
             if not query.startswith(('http://', 'https://')):
@@ -194,7 +594,7 @@ class MusicPlayer:
             }
             
             # Cache the result
-            self.ydl_cache[cache_key] = {k: v for k, v in song_data.items() if k != 'requester'}
+            self.ydl_cache.set(cache_key, {k: v for k, v in song_data.items() if k != 'requester'})
             
             return Song(**song_data)
             
@@ -202,6 +602,196 @@ class MusicPlayer:
             logger.error(f"Search error: {e}")
             return None
     
+    async def measure_loudness(self, url: str) -> Optional[Tuple[float, Optional[float]]]:
+        """EBU R128 integrated loudness and sample peak of a stream, via ffmpeg's ebur128 filter"""
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-nostats', '-hide_banner',
+            '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+            '-t', str(self.loudness_analysis_seconds), '-i', url,
+            # Per-frame measurements go to the verbose log level, leaving only the summary
+            '-vn', '-af', 'ebur128=peak=sample:framelog=verbose', '-f', 'null', '-',
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=300)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            # Timed out or cancelled: don't leave ffmpeg running
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        
+        summary = stderr.decode('utf-8', errors='ignore').rpartition('Summary:')[2]
+        loudness = re.search(r'I:\s+(-?[\d.]+) LUFS', summary)
+        if not loudness:
+            return None
+        peak = re.search(r'Peak:\s+(-?[\d.]+) dBFS', summary)
+        return float(loudness.group(1)), float(peak.group(1)) if peak else None
+    
+    def schedule_loudness_analysis(self, song: Song):
+        """Measure the track's loudness once in the background"""
+        key = song.webpage_url
+        if not self.loudness_enabled or not key or key in self.loudness_tasks or key in self.loudness_cache:
+            return
+        # Live streams have no duration and are read at real time, so the
+        # analysis would only ever end in the timeout
+        if song.duration == "Unknown":
+            return
+        
+        async def analyze():
+            measured = None
+            try:
+                async with self.loudness_semaphore:
+                    self.loudness_running.add(key)
+                    measured = await self.measure_loudness(song.url)
+            except FileNotFoundError:
+                logger.warning("ffmpeg not found, loudness normalization disabled")
+                self.loudness_enabled = False
+                return
+            except Exception as e:
+                logger.error(f"Loudness analysis error: {e}")
+            finally:
+                self.loudness_tasks.pop(key, None)
+                self.loudness_running.discard(key)
+            
+            if measured:
+                self.loudness_cache.set(key, measured)
+            else:
+                # Remember the failure so every play doesn't measure it again
+                self.loudness_cache.set(key, (), ttl=self.loudness_retry_seconds)
+        
+        self.loudness_tasks[key] = asyncio.create_task(analyze())
+    
+    async def wait_for_loudness(self, song: Song):
+        """Give a measurement already underway a moment to finish before the track starts"""
+        key = song.webpage_url
+        task = self.loudness_tasks.get(key) if key else None
+        if task is None or key not in self.loudness_running:
+            return  # still queued behind other measurements: don't hold up playback
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=self.loudness_wait_seconds)
+        except asyncio.TimeoutError:
+            pass  # play it at the default volume; later plays get the measured gain
+    
+    def playback_gain(self, song: Song) -> Optional[float]:
+        """Static gain in dB bringing the track to the loudness target, if it was measured"""
+        measured = self.loudness_cache.get(song.webpage_url) if song.webpage_url else None
+        if not measured:
+            return None
+        
+        loudness, peak = measured
+        if loudness <= -70:  # silence, the ebur128 gate floor
+            return None
+        
+        gain = self.loudness_target - loudness
+        if peak is not None:
+            gain = min(gain, -1.0 - peak)  # keep sample peaks below -1 dBFS
+        return round(max(-20.0, min(gain, 12.0)), 1)
+    
+    def ffmpeg_options_for(self, song: Song) -> dict:
+        gain = self.playback_gain(song)
+        if gain is None:
+            self.schedule_loudness_analysis(song)
+            return self.ffmpeg_options
+        
+        return {
+            **self.ffmpeg_options,
+            'options': f'-vn -filter:a "volume={gain}dB" -bufsize 512k'
+        }
+    
+    def normalize_query(self, query: str) -> str:
+        return " ".join(query.lower().split())
+    
+    async def flat_search(self, query: str, limit: int = 10) -> List[dict]:
+        """Cheap search that lists results without resolving stream URLs"""
+        cache_key = self.normalize_query(query)
+        
+        results = self.search_cache.get(cache_key)
+        if results is not None:
+            return results[:limit]
+        
+        return await self.fetch_flat_search(cache_key, limit)
+    
+    async def fetch_flat_search(self, cache_key: str, limit: int = 10) -> List[dict]:
+        """Fetch a flat search, sharing one request between everyone waiting on the same query"""
+        task = self.inflight_searches.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self.run_flat_search(cache_key, limit))
+            self.inflight_searches[cache_key] = task
+            task.add_done_callback(lambda _: self.inflight_searches.pop(cache_key, None))
+        
+        # A cancelled caller leaves the fetch running so its results still reach the cache
+        results = await asyncio.shield(task)
+        return results[:limit]
+    
+    async def run_flat_search(self, cache_key: str, limit: int) -> List[dict]:
+        try:
+            loop = asyncio.get_event_loop()
+            
+            def extract():
+                with yt_dlp.YoutubeDL(self.flat_ydl_options) as ydl:
+                    info = ydl.extract_info(f"ytsearch{limit}:{cache_key}", download=False)
+                    if not info:
+                        return []
+                    return info.get('entries') or []
+            
+            entries = await loop.run_in_executor(self.search_executor, extract)
+        except Exception as e:
+            logger.error(f"Flat search error: {e}")
+            return []
+        
+        results = []
+        for entry in entries:
+            if not entry:
+                continue
+            url = entry.get('url') or entry.get('webpage_url')
+            if not url and entry.get('id'):
+                url = f"https://www.youtube.com/watch?v={entry['id']}"
+            if not url:
+                continue
+            results.append({
+                'title': (entry.get('title') or 'Unknown Title')[:100],
+                'url': url,
+                'duration': self.format_duration(entry.get('duration')),
+                'uploader': (entry.get('uploader') or entry.get('channel') or 'Unknown')[:50],
+            })
+        
+        self.search_cache.set(cache_key, results)
+        return results
+    
+    async def autocomplete_search(self, user_id: int, query: str) -> List[dict]:
+        """Flat search for autocomplete, cancelling the user's superseded keystrokes"""
+        cache_key = self.normalize_query(query)
+        if len(cache_key) < 2 or cache_key.startswith(('http://', 'https://')):
+            return []
+        
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        previous = self.pending_searches.get(user_id)
+        if previous and not previous.done():
+            previous.cancel()
+        
+        async def debounced():
+            await asyncio.sleep(self.autocomplete_delay)
+            return await self.fetch_flat_search(cache_key)
+        
+        task = asyncio.ensure_future(debounced())
+        self.pending_searches[user_id] = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Superseded by a newer keystroke: Discord ignores this response anyway
+            if self.pending_searches.get(user_id) is not task:
+                return []
+            raise
+        finally:
+            if self.pending_searches.get(user_id) is task:
+                del self.pending_searches[user_id]
+    
     def format_duration(self, duration):
         if not duration:
             return "Unknown"
@@ -231,6 +821,7 @@ class MusicPlayer:
         
         if not song:
             guild_data['current_song'] = None
+            self.schedule_now_playing_update(guild)
             # Auto-disconnect after 5 minutes of inactivity
             if guild_data['auto_disconnect_task']:
                 guild_data['auto_disconnect_task'].cancel()
@@ -241,9 +832,24 @@ class MusicPlayer:
             return
         
         guild_data['current_song'] = song
+        source = None
+        
+        guild_data['starting'] = True
+        try:
+            await self.wait_for_loudness(song)
+        finally:
+            guild_data['starting'] = False
+        if guild_data['current_song'] is not song or not voice_client.is_connected():
+            # Stopped while waiting. A /play in the meantime only queued its song
+            # because we were starting, so start it now instead
+            current = guild.voice_client
+            if (guild_data['current_song'] is None and len(guild_data['queue'])
+                    and current and current.is_connected() and not current.is_playing()):
+                await self.play_next(guild)
+            return
         
         try:
-            source = discord.FFmpegPCMAudio(song.url, **self.ffmpeg_options)
+            source = self.stream_pool.open(song.webpage_url or song.url, song.url, self.ffmpeg_options_for(song))
             
             def after_playing(error):
                 if error:
@@ -255,14 +861,12 @@ class MusicPlayer:
                 )
             
             voice_client.play(source, after=after_playing)
-            
-            # Send now playing embed
-            if guild_data['text_channel']:
-                embed = self.create_now_playing_embed(song, len(guild_data['queue']))
-                await guild_data['text_channel'].send(embed=embed)
+            self.schedule_now_playing_update(guild)
                 
         except Exception as e:
             logger.error(f"Playback error: {e}")
+            if source:
+                source.cleanup()
             await self.play_next(guild)
     
     async def auto_disconnect(self, guild, delay):
@@ -282,18 +886,126 @@ class MusicPlayer:
                 )
                 await guild_data['text_channel'].send(embed=embed)
     
-    def create_now_playing_embed(self, song: Song, queue_length: int):
+    async def stop(self, guild):
+        """Clear the queue, stop playback and leave the voice channel"""
+        guild_data = self.guilds_data[guild.id]
+        await guild_data['queue'].clear()
+        guild_data['current_song'] = None
+        
+        voice_client = guild.voice_client
+        if voice_client:
+            if voice_client.is_playing() or voice_client.is_paused():
+                voice_client.stop()
+            await voice_client.disconnect()
+        
+        self.schedule_now_playing_update(guild)
+    
+    def get_now_playing_view(self):
+        # Views need a running loop, so the shared panel view is built on first use
+        if self.now_playing_view is None:
+            self.now_playing_view = NowPlayingView()
+        return self.now_playing_view
+    
+    def schedule_now_playing_update(self, guild):
+        """Refresh the guild's now-playing panel, coalescing bursts into one edit"""
+        guild_data = self.guilds_data[guild.id]
+        task = guild_data['now_playing_task']
+        if task and not task.done():
+            return
+        guild_data['now_playing_task'] = asyncio.create_task(self.update_now_playing(guild))
+    
+    async def update_now_playing(self, guild):
+        await asyncio.sleep(self.now_playing_delay)
+        guild_data = self.guilds_data[guild.id]
+        # Changes from here on need a fresh update
+        guild_data['now_playing_task'] = None
+        
+        channel = guild_data['text_channel']
+        if not channel:
+            return
+        
+        song = guild_data['current_song']
+        if song:
+            voice_client = guild.voice_client
+            paused = bool(voice_client and voice_client.is_paused())
+            embed = self.create_now_playing_embed(
+                song, len(guild_data['queue']), loop=guild_data['loop'], paused=paused
+            )
+            view = self.get_now_playing_view()
+        else:
+            embed = discord.Embed(
+                title="Đã Phát Xong",
+                description="Hàng đợi trống. Sử dụng `/play` để thêm nhạc!",
+                color=0x808080
+            )
+            view = None
+        
+        message = guild_data['now_playing_message']
+        if not song:
+            # The session is over: the next one posts a fresh panel at the bottom of the channel
+            guild_data['now_playing_message'] = None
+        try:
+            if message and (message.channel.id == channel.id or not song):
+                try:
+                    await message.edit(embed=embed, view=view)
+                    return
+                except discord.NotFound:
+                    pass  # panel was deleted, post a new one
+            elif message:
+                # Music moved to another channel: retire the old panel's buttons
+                try:
+                    await message.edit(view=None)
+                except discord.NotFound:
+                    pass
+            
+            if song:
+                guild_data['now_playing_message'] = await channel.send(embed=embed, view=view)
+        except Exception as e:
+            logger.error(f"Now playing update error: {e}")
+    
+    async def create_queue_embed(self, guild_id):
+        guild_data = self.guilds_data[guild_id]
+        queue_items = await guild_data['queue'].list_items(10)
+        
+        if not queue_items:
+            return discord.Embed(
+                title="Hàng Đợi Trống",
+                description="Không có bài hát nào trong hàng đợi. Sử dụng `/play` để thêm nhạc!",
+                color=0x808080
+            )
+        
+        embed = discord.Embed(
+            title="Hàng Đợi Nhạc",
+            color=0x00ff88
+        )
+        
+        queue_text = []
+        for i, song in enumerate(queue_items, 1):
+            queue_text.append(f"`{i}.` **{song.title}** - `{song.duration}`")
+        
+        embed.description = "\n".join(queue_text)
+        
+        total_songs = len(guild_data['queue'])
+        if total_songs > 10:
+            embed.set_footer(text=f"Hiển thị 10 trong {total_songs} bài hát")
+        else:
+            embed.set_footer(text=f"Tổng cộng: {total_songs} bài hát")
+        
+        return embed
+    
+    def create_now_playing_embed(self, song: Song, queue_length: int, loop: bool = False, paused: bool = False):
         """Create beautiful now playing embed with Vietnamese text"""
         embed = discord.Embed(
-            title="Đang Phát",
+            title="Tạm Dừng" if paused else "Đang Phát",
             description=f"**{song.title}**",
-            color=0x00ff88
+            color=0xffff00 if paused else 0x00ff88
         )
         
         embed.add_field(name="Nghệ sĩ", value=song.uploader, inline=True)
         embed.add_field(name="Thời lượng", value=song.duration, inline=True)
         embed.add_field(name="Hàng đợi", value=f"{queue_length} bài hát", inline=True)
         embed.add_field(name="Được yêu cầu bởi", value=song.requester, inline=True)
+        embed.add_field(name="Lặp lại", value="Bật" if loop else "Tắt", inline=True)
         
         if song.thumbnail:
             embed.set_thumbnail(url=song.thumbnail)
@@ -310,18 +1022,47 @@ class WeatherService:
     def __init__(self):
         self.api_key = OPENWEATHER_API_KEY
         self.base_url = "http://api.openweathermap.org/data/2.5"
-        self.cache = {}
         self.cache_duration = 600  # 10 minutes
+        self.cache = cache_store.namespace('weather', max_bytes=256 * 1024, ttl=self.cache_duration)
+        self.forecast_cache = cache_store.namespace('forecasts', max_bytes=1024 * 1024, ttl=self.cache_duration)
+    
+    async def get_forecast(self, city: str, session: aiohttp.ClientSession) -> Optional[ForecastSeries]:
+        """Get the 5-day/3-hour forecast with caching"""
+        cache_key = city.lower()
+        
+        cached_data = self.forecast_cache.get(cache_key)
+        if cached_data:
+            return cached_data
+        
+        try:
+            url = f"{self.base_url}/forecast"
+            params = {
+                'q': f"{city},VN",
+                'appid': self.api_key,
+                'units': 'metric'
+            }
+            
+            async with session.get(url, params=params) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    forecast = ForecastSeries.from_api(data)
+                    
+                    # Cache the result
+                    self.forecast_cache.set(cache_key, forecast)
+                    return forecast
+                
+        except Exception as e:
+            logger.error(f"Forecast API error: {e}")
+        
+        return None
     
     async def get_weather(self, city: str, session: aiohttp.ClientSession) -> Optional[WeatherData]:
         """Get weather data with caching"""
         cache_key = city.lower()
-        current_time = time.time()
         
-        if cache_key in self.cache:
-            cached_data, timestamp = self.cache[cache_key]
-            if current_time - timestamp < self.cache_duration:
-                return cached_data
+        cached_data = self.cache.get(cache_key)
+        if cached_data:
+            return cached_data
         
         try:
             url = f"{self.base_url}/weather"
@@ -346,7 +1087,7 @@ class WeatherService:
                     )
                     
                     # Cache the result
-                    self.cache[cache_key] = (weather_data, current_time)
+                    self.cache.set(cache_key, weather_data)
                     return weather_data
                 
         except Exception as e:
@@ -372,6 +1113,30 @@ class WeatherService:
         embed.set_footer(text="Dữ liệu từ OpenWeatherMap")
         
         return embed
+    
+    def create_forecast_embed(self, forecast: ForecastSeries):
+        """Create daily forecast embed with Vietnamese text"""
+        weekdays = ["Thứ Hai", "Thứ Ba", "Thứ Tư", "Thứ Năm", "Thứ Sáu", "Thứ Bảy", "Chủ Nhật"]
+        days = forecast.daily_summary()
+        
+        embed = discord.Embed(
+            title=f"Dự Báo Thời Tiết tại {forecast.city}",
+            color=0x87CEEB
+        )
+        
+        for day in days:
+            embed.add_field(
+                name=f"{weekdays[day.weekday]} {day.date}",
+                value=f"{day.temp_min}°C - {day.temp_max}°C\n"
+                      f"TB {day.temp_mean}°C • Mưa {day.rain_probability}%",
+                inline=True
+            )
+        
+        if days:
+            embed.set_thumbnail(url=f"http://openweathermap.org/img/wn/{days[0].icon}@2x.png")
+        embed.set_footer(text="Dữ liệu từ OpenWeatherMap • 5 ngày, mỗi 3 giờ")
+        
+        return embed
 
 class AIService:
     """Gemini AI integration service"""
@@ -416,18 +1181,132 @@ Hãy trả lời một cách tự nhiên, thân thiện và hữu ích bằng ti
         
         return None
 
+class MemberAnnouncer:
+    """Welcome/goodbye announcements, batched into one digest per guild per window"""
+    
+    def __init__(self, window: float):
+        self.window = window
+        self.pending = defaultdict(lambda: {'joins': [], 'leaves': []})
+        self.flush_tasks = {}
+    
+    async def member_joined(self, member):
+        avatar = member.avatar or member.default_avatar
+        await self.announce(member.guild, 'joins', {'mention': member.mention, 'avatar_url': avatar.url})
+    
+    async def member_left(self, guild, user):
+        await self.announce(guild, 'leaves', {'name': user.display_name})
+    
+    async def announce(self, guild, kind, entry):
+        if not guild.system_channel:
+            return
+        
+        if self.window <= 0:
+            batch = {'joins': [], 'leaves': []}
+            batch[kind].append(entry)
+            return await self.send(guild, batch)
+        
+        self.pending[guild.id][kind].append(entry)
+        if guild.id not in self.flush_tasks:
+            self.flush_tasks[guild.id] = asyncio.create_task(self.flush_later(guild))
+    
+    async def flush_later(self, guild):
+        await asyncio.sleep(self.window)
+        del self.flush_tasks[guild.id]
+        batch = self.pending.pop(guild.id, None)
+        if batch:
+            await self.send(guild, batch)
+    
+    async def send(self, guild, batch):
+        channel = guild.system_channel
+        if not channel:
+            return
+        
+        embeds = []
+        if batch['joins']:
+            embeds.append(self.create_welcome_embed(guild, batch['joins']))
+        if batch['leaves']:
+            embeds.append(self.create_goodbye_embed(batch['leaves']))
+        
+        try:
+            await channel.send(embeds=embeds)
+        except Exception as e:
+            logger.error(f"Member announcement error: {e}")
+    
+    def summarize(self, names: List[str], limit: int = 50) -> str:
+        text = ", ".join(names[:limit])
+        if len(names) > limit:
+            text += f" và {len(names) - limit} người khác"
+        return text
+    
+    def create_welcome_embed(self, guild, joins: List[dict]):
+        """Create welcome embed with Vietnamese text"""
+        if len(joins) == 1:
+            embed = discord.Embed(
+                title="Chào mừng đến với server!",
+                description=f"Xin chào {joins[0]['mention']}! Chào mừng bạn đến với **{guild.name}**!\n"
+                           f"Gõ `/help` để xem tất cả các lệnh có sẵn.",
+                color=0x00ff88
+            )
+            embed.set_thumbnail(url=joins[0]['avatar_url'])
+        else:
+            embed = discord.Embed(
+                title=f"Chào mừng {len(joins)} thành viên mới!",
+                description=f"Xin chào {self.summarize([join['mention'] for join in joins])}!\n"
+                           f"Chào mừng các bạn đến với **{guild.name}**! Gõ `/help` để xem tất cả các lệnh có sẵn.",
+                color=0x00ff88
+            )
+        embed.set_footer(text="Chúc bạn có trải nghiệm vui vẻ!")
+        return embed
+    
+    def create_goodbye_embed(self, leaves: List[dict]):
+        """Create goodbye embed with Vietnamese text"""
+        if len(leaves) == 1:
+            embed = discord.Embed(
+                title="Tạm biệt!",
+                description=f"**{leaves[0]['name']}** đã rời server. Hẹn gặp lại!",
+                color=0xff6b6b
+            )
+        else:
+            embed = discord.Embed(
+                title=f"Tạm biệt {len(leaves)} thành viên!",
+                description=f"{self.summarize(['**' + leave['name'] + '**' for leave in leaves])} đã rời server. Hẹn gặp lại!",
+                color=0xff6b6b
+            )
+        embed.set_footer(text="Chúng tôi sẽ nhớ bạn!")
+        return embed
+
+def resident_memory_mb() -> Optional[float]:
+    """Current resident set size of the process, if the platform exposes it"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def gateway_options(lean: bool) -> dict:
+    """Client member-cache options; lean mode keeps only members in voice channels"""
+    if not lean:
+        return {}
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+    return {'member_cache_flags': member_cache_flags, 'chunk_guilds_at_startup': False}
+
 # Bot setup with optimized intents
 intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents, case_insensitive=True)
+bot = commands.Bot(command_prefix="!", intents=intents, case_insensitive=True, **gateway_options(LEAN_GATEWAY))
 
 # Initialize services
 music_player = MusicPlayer(bot)
 weather_service = WeatherService()
 ai_service = AIService()
+member_announcer = MemberAnnouncer(MEMBER_DIGEST_WINDOW)
 
 # FIXED: Autocomplete function for cities
 async def city_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
@@ -445,6 +1324,14 @@ async def on_ready():
         synced = await bot.tree.sync()
         logger.info(f"Bot đã online! Đã đồng bộ {len(synced)} lệnh")
         
+        memory = resident_memory_mb()
+        logger.info(
+            f"Ready after {time.perf_counter() - STARTUP_TIME:.1f}s, "
+            f"{len(bot.guilds)} guilds, {len(bot.users)} cached users, "
+            f"RSS {f'{memory:.1f} MB' if memory is not None else 'n/a'} "
+            f"(lean gateway: {'on' if LEAN_GATEWAY else 'off'})"
+        )
+        
         # Set rich presence
         activity = discord.Activity(
             type=discord.ActivityType.listening,
@@ -455,8 +1342,8 @@ async def on_ready():
             activity=activity
         )
         
-        # Start cleanup task
-        cleanup_cache.start()
+        # Keep panel buttons from before a restart working
+        bot.add_view(music_player.get_now_playing_view())
         
         print(f"""
 ╔══════════════════════════════════════╗
@@ -476,79 +1363,27 @@ async def on_ready():
 @bot.event
 async def on_member_join(member):
     """Welcome new members with Vietnamese"""
-    if member.guild.system_channel:
-        embed = discord.Embed(
-            title="Chào mừng đến với server!",
-            description=f"Xin chào {member.mention}! Chào mừng bạn đến với **{member.guild.name}**!\n"
-                       f"Gõ `/help` để xem tất cả các lệnh có sẵn.",
-            color=0x00ff88
-        )
-        embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
-        embed.set_footer(text="Chúc bạn có trải nghiệm vui vẻ!")
-        
-        await member.guild.system_channel.send(embed=embed)
+    await member_announcer.member_joined(member)
 
 @bot.event
-async def on_member_remove(member):
-    """Goodbye message in Vietnamese"""
-    if member.guild.system_channel:
-        embed = discord.Embed(
-            title="Tạm biệt!",
-            description=f"**{member.display_name}** đã rời server. Hẹn gặp lại!",
-            color=0xff6b6b
-        )
-        embed.set_footer(text="Chúng tôi sẽ nhớ bạn!")
-        
-        await member.guild.system_channel.send(embed=embed)
-
-@tasks.loop(hours=1)
-async def cleanup_cache():
-    """Clean up old cache entries"""
-    try:
-        # Clean music cache
-        if len(music_player.ydl_cache) > 100:
-            items = list(music_player.ydl_cache.items())
-            music_player.ydl_cache = dict(items[-50:])
-        
-        # Clean weather cache
-        current_time = time.time()
-        expired_keys = [
-            key for key, (_, timestamp) in weather_service.cache.items()
-            if current_time - timestamp > weather_service.cache_duration
-        ]
-        for key in expired_keys:
-            del weather_service.cache[key]
-            
-        logger.info("Cache cleaned up successfully")
-            
-    except Exception as e:
-        logger.error(f"Cache cleanup error: {e}")
+async def on_raw_member_remove(payload):
+    """Goodbye message in Vietnamese, also for members that were never cached"""
+    guild = bot.get_guild(payload.guild_id)
+    if guild:
+        await member_announcer.member_left(guild, payload.user)
 
 # Music Commands
-@bot.tree.command(name="play", description="Phát nhạc hoặc thêm vào hàng đợi")
-@app_commands.describe(query="Tên bài hát hoặc URL YouTube")
-async def play(interaction: discord.Interaction, query: str):
-    await interaction.response.defer()
-    
-    if not interaction.user.voice or not interaction.user.voice.channel:
-        embed = discord.Embed(
-            title="Chưa Vào Kênh Voice",
-            description="Bạn cần vào một kênh voice trước!",
-            color=0xff6b6b
-        )
-        return await interaction.followup.send(embed=embed, ephemeral=True)
-    
-    # Search for song
-    song = await music_player.search_song(query, interaction.user.display_name)
-    
-    if not song:
-        embed = discord.Embed(
-            title="Không Tìm Thấy Bài Hát",
-            description=f"Không tìm thấy: **{query}**",
-            color=0xff6b6b
-        )
-        return await interaction.followup.send(embed=embed, ephemeral=True)
-    
+async def song_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    """Suggest songs from a flat search; picking one passes its URL to /play"""
+    results = await music_player.autocomplete_search(interaction.user.id, current)
+    return [
+        app_commands.Choice(name=f"{result['title']} ({result['duration']})"[:100], value=result['url'])
+        for result in results
+        if len(result['url']) <= 100
+    ][:25]
+
+async def enqueue_song(interaction: discord.Interaction, song: Song):
+    """Connect to the user's voice channel, queue the song and reply with the result"""
     # Connect to voice if needed
     voice_client = interaction.guild.voice_client
     if not voice_client:
@@ -567,11 +1402,12 @@ async def play(interaction: discord.Interaction, query: str):
     # Set text channel for updates
     music_player.guilds_data[interaction.guild.id]['text_channel'] = interaction.channel
     
-    # Add to queue
+    # Add to queue and measure its loudness while it waits
     await music_player.guilds_data[interaction.guild.id]['queue'].append(song)
+    music_player.schedule_loudness_analysis(song)
     
-    # Start playing if nothing is playing
-    if not voice_client.is_playing():
+    # Start playing if nothing is playing (or about to)
+    if not voice_client.is_playing() and not music_player.guilds_data[interaction.guild.id]['starting']:
         await music_player.play_next(interaction.guild)
         embed = discord.Embed(
             title="Đang Phát",
@@ -579,6 +1415,7 @@ async def play(interaction: discord.Interaction, query: str):
             color=0x00ff88
         )
     else:
+        # The panel's queue count catches up on the next track change, not on every add
         queue_length = len(music_player.guilds_data[interaction.guild.id]['queue'])
         embed = discord.Embed(
             title="Đã Thêm Vào Hàng Đợi",
@@ -593,6 +1430,180 @@ async def play(interaction: discord.Interaction, query: str):
     
     await interaction.followup.send(embed=embed)
 
+def not_in_voice_embed():
+    return discord.Embed(
+        title="Chưa Vào Kênh Voice",
+        description="Bạn cần vào một kênh voice trước!",
+        color=0xff6b6b
+    )
+
+class SearchResultSelect(discord.ui.Select):
+    """Dropdown of flat search results; only the picked one is fully extracted"""
+    
+    def __init__(self, results: List[dict]):
+        options = [
+            discord.SelectOption(
+                label=result['title'][:100],
+                description=f"{result['uploader']} • {result['duration']}"[:100],
+                value=str(index)
+            )
+            for index, result in enumerate(results[:25])
+        ]
+        super().__init__(placeholder="Chọn bài hát để phát...", options=options)
+        self.results = results
+    
+    async def callback(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        self.view.stop()
+        await interaction.edit_original_response(view=None)
+        
+        if not interaction.user.voice or not interaction.user.voice.channel:
+            return await interaction.followup.send(embed=not_in_voice_embed(), ephemeral=True)
+        
+        result = self.results[int(self.values[0])]
+        song = await music_player.search_song(result['url'], interaction.user.display_name)
+        
+        if not song:
+            embed = discord.Embed(
+                title="Không Tìm Thấy Bài Hát",
+                description=f"Không thể phát: **{result['title']}**",
+                color=0xff6b6b
+            )
+            return await interaction.followup.send(embed=embed, ephemeral=True)
+        
+        await enqueue_song(interaction, song)
+
+class SearchResultView(discord.ui.View):
+    """Search result picker, usable only by the user who ran /search"""
+    
+    def __init__(self, user_id: int, results: List[dict]):
+        super().__init__(timeout=60)
+        self.user_id = user_id
+        self.message = None  # the followup carrying this view, set by /search
+        self.add_item(SearchResultSelect(results))
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("Đây không phải kết quả tìm kiếm của bạn!", ephemeral=True)
+            return False
+        return True
+    
+    async def on_timeout(self):
+        # An expired dropdown would only answer with "This interaction failed"
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+class NowPlayingView(discord.ui.View):
+    """Controls on the now-playing panel, shared by every guild's panel message"""
+    
+    def __init__(self):
+        super().__init__(timeout=None)
+    
+    async def nothing_playing(self, interaction: discord.Interaction):
+        embed = discord.Embed(
+            title="Không Có Nhạc",
+            description="Hiện tại không có bài hát nào đang phát!",
+            color=0xff6b6b
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @discord.ui.button(label="Tạm dừng/Tiếp tục", style=discord.ButtonStyle.secondary, custom_id="now_playing:pause")
+    async def pause_resume(self, interaction: discord.Interaction, button: discord.ui.Button):
+        voice_client = interaction.guild.voice_client
+        if voice_client and voice_client.is_playing():
+            voice_client.pause()
+        elif voice_client and voice_client.is_paused():
+            voice_client.resume()
+        else:
+            return await self.nothing_playing(interaction)
+        
+        await interaction.response.defer()
+        music_player.schedule_now_playing_update(interaction.guild)
+    
+    @discord.ui.button(label="Bỏ qua", style=discord.ButtonStyle.primary, custom_id="now_playing:skip")
+    async def skip(self, interaction: discord.Interaction, button: discord.ui.Button):
+        voice_client = interaction.guild.voice_client
+        if not voice_client or not (voice_client.is_playing() or voice_client.is_paused()):
+            return await self.nothing_playing(interaction)
+        
+        # The panel is refreshed by play_next once the next song starts
+        await interaction.response.defer()
+        voice_client.stop()
+    
+    @discord.ui.button(label="Lặp lại", style=discord.ButtonStyle.secondary, custom_id="now_playing:loop")
+    async def loop(self, interaction: discord.Interaction, button: discord.ui.Button):
+        guild_data = music_player.guilds_data[interaction.guild.id]
+        guild_data['loop'] = not guild_data['loop']
+        
+        await interaction.response.defer()
+        music_player.schedule_now_playing_update(interaction.guild)
+    
+    @discord.ui.button(label="Hàng đợi", style=discord.ButtonStyle.secondary, custom_id="now_playing:queue")
+    async def queue(self, interaction: discord.Interaction, button: discord.ui.Button):
+        embed = await music_player.create_queue_embed(interaction.guild.id)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    
+    @discord.ui.button(label="Dừng", style=discord.ButtonStyle.danger, custom_id="now_playing:stop")
+    async def stop_playback(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not interaction.guild.voice_client:
+            return await self.nothing_playing(interaction)
+        
+        await interaction.response.defer()
+        await music_player.stop(interaction.guild)
+
+@bot.tree.command(name="play", description="Phát nhạc hoặc thêm vào hàng đợi")
+@app_commands.describe(query="Tên bài hát hoặc URL YouTube")
+@app_commands.autocomplete(query=song_autocomplete)
+async def play(interaction: discord.Interaction, query: str):
+    await interaction.response.defer()
+    
+    if not interaction.user.voice or not interaction.user.voice.channel:
+        return await interaction.followup.send(embed=not_in_voice_embed(), ephemeral=True)
+    
+    # Search for song
+    song = await music_player.search_song(query, interaction.user.display_name)
+    
+    if not song:
+        embed = discord.Embed(
+            title="Không Tìm Thấy Bài Hát",
+            description=f"Không tìm thấy: **{query}**",
+            color=0xff6b6b
+        )
+        return await interaction.followup.send(embed=embed, ephemeral=True)
+    
+    await enqueue_song(interaction, song)
+
+@bot.tree.command(name="search", description="Tìm kiếm bài hát và chọn bài để phát")
+@app_commands.describe(query="Tên bài hát cần tìm")
+async def search(interaction: discord.Interaction, query: str):
+    await interaction.response.defer()
+    
+    results = await music_player.flat_search(query)
+    
+    if not results:
+        embed = discord.Embed(
+            title="Không Tìm Thấy Bài Hát",
+            description=f"Không tìm thấy: **{query}**",
+            color=0xff6b6b
+        )
+        return await interaction.followup.send(embed=embed, ephemeral=True)
+    
+    embed = discord.Embed(
+        title="Kết Quả Tìm Kiếm",
+        description="\n".join(
+            f"`{i}.` **{result['title']}** - `{result['duration']}`"
+            for i, result in enumerate(results, 1)
+        ),
+        color=0x00ff88
+    )
+    embed.set_footer(text=f"Tìm kiếm bởi {interaction.user.display_name}")
+    
+    view = SearchResultView(interaction.user.id, results)
+    view.message = await interaction.followup.send(embed=embed, view=view)
+
 @bot.tree.command(name="skip", description="Bỏ qua bài hát hiện tại")
 async def skip(interaction: discord.Interaction):
     voice_client = interaction.guild.voice_client
@@ -616,34 +1627,7 @@ async def skip(interaction: discord.Interaction):
 
 @bot.tree.command(name="queue", description="Hiển thị hàng đợi nhạc")
 async def queue_command(interaction: discord.Interaction):
-    guild_data = music_player.guilds_data[interaction.guild.id]
-    queue_items = await guild_data['queue'].list_items(10)
-    
-    if not queue_items:
-        embed = discord.Embed(
-            title="Hàng Đợi Trống",
-            description="Không có bài hát nào trong hàng đợi. Sử dụng `/play` để thêm nhạc!",
-            color=0x808080
-        )
-        return await interaction.response.send_message(embed=embed)
-    
-    embed = discord.Embed(
-        title="Hàng Đợi Nhạc",
-        color=0x00ff88
-    )
-    
-    queue_text = []
-    for i, song in enumerate(queue_items, 1):
-        queue_text.append(f"`{i}.` **{song.title}** - `{song.duration}`")
-    
-    embed.description = "\n".join(queue_text)
-    
-    total_songs = len(guild_data['queue'])
-    if total_songs > 10:
-        embed.set_footer(text=f"Hiển thị 10 trong {total_songs} bài hát")
-    else:
-        embed.set_footer(text=f"Tổng cộng: {total_songs} bài hát")
-    
+    embed = await music_player.create_queue_embed(interaction.guild.id)
     await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="stop", description="Dừng nhạc và ngắt kết nối")
@@ -658,14 +1642,7 @@ async def stop(interaction: discord.Interaction):
         )
         return await interaction.response.send_message(embed=embed, ephemeral=True)
     
-    # Clear queue and stop
-    await music_player.guilds_data[interaction.guild.id]['queue'].clear()
-    music_player.guilds_data[interaction.guild.id]['current_song'] = None
-    
-    if voice_client.is_playing():
-        voice_client.stop()
-    
-    await voice_client.disconnect()
+    await music_player.stop(interaction.guild)
     
     embed = discord.Embed(
         title="Đã Dừng",
@@ -678,6 +1655,7 @@ async def stop(interaction: discord.Interaction):
 async def loop_command(interaction: discord.Interaction):
     guild_data = music_player.guilds_data[interaction.guild.id]
     guild_data['loop'] = not guild_data['loop']
+    music_player.schedule_now_playing_update(interaction.guild)
     
     status = "Bật" if guild_data['loop'] else "Tắt"
     embed = discord.Embed(
@@ -701,7 +1679,7 @@ async def nowplaying(interaction: discord.Interaction):
         )
         return await interaction.response.send_message(embed=embed, ephemeral=True)
     
-    embed = music_player.create_now_playing_embed(current_song, len(guild_data['queue']))
+    embed = music_player.create_now_playing_embed(current_song, len(guild_data['queue']), loop=guild_data['loop'])
     await interaction.response.send_message(embed=embed)
 
 # Weather Commands
@@ -725,6 +1703,26 @@ async def weather(interaction: discord.Interaction, city: str):
     embed = weather_service.create_weather_embed(weather_data)
     await interaction.followup.send(embed=embed)
 
+@bot.tree.command(name="forecast", description="5-day forecast for Vietnam cities")
+@app_commands.describe(city="City name (Vietnam)")
+@app_commands.autocomplete(city=city_autocomplete)
+async def forecast(interaction: discord.Interaction, city: str):
+    await interaction.response.defer()
+    
+    async with aiohttp.ClientSession() as session:
+        forecast_data = await weather_service.get_forecast(city, session)
+    
+    if not forecast_data:
+        embed = discord.Embed(
+            title="Forecast Not Found",
+            description=f"Couldn't get forecast for **{city}**\nTry: {', '.join(VIETNAM_CITIES[:5])}...",
+            color=0xff6b6b
+        )
+        return await interaction.followup.send(embed=embed, ephemeral=True)
+    
+    embed = weather_service.create_forecast_embed(forecast_data)
+    await interaction.followup.send(embed=embed)
+
 @bot.tree.command(name="weather_vietnam", description="Popular Vietnam cities weather")
 async def weather_vietnam(interaction: discord.Interaction):
     await interaction.response.defer()
@@ -790,6 +1788,7 @@ async def help_command(interaction: discord.Interaction):
     
     music_commands = [
         "`/play [song]` - Play music",
+        "`/search [song]` - Search and pick a song",
         "`/skip` - Skip current song",
         "`/queue` - Show queue",
         "`/stop` - Stop and disconnect",
@@ -799,6 +1798,7 @@ async def help_command(interaction: discord.Interaction):
     
     weather_commands = [
         "`/weather [city]` - Get weather",
+        "`/forecast [city]` - 5-day forecast",
         "`/weather_vietnam` - Vietnam overview"
     ]
     
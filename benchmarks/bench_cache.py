@@ -0,0 +1,107 @@
+"""Old ad hoc song cache vs ``BoundedCache`` under a burst.
+
+Replays a Zipf-distributed stream of song lookups with a burst of
+one-off queries in the middle. The old policy is a plain dict that the
+hourly ``cleanup_cache`` task cut down to its last 50 insertions once it
+held more than 100; the new one is the LRU/TTL ``BoundedCache`` with a
+byte budget. Reports hit rate and peak bytes held.
+
+    python -m benchmarks.bench_cache --requests 200000
+"""
+import argparse
+import logging
+import random
+
+from benchmarks import stubs  # must come first: sets the env vars MusicBot checks on import
+
+import MusicBot
+
+
+def song_entry(key):
+    return {
+        "title": f"Song {key}",
+        # Real googlevideo stream URLs run to roughly a kilobyte
+        "url": f"https://rr1---sn-invalid.googlevideo.com/videoplayback?id={key}&" + "x" * 900,
+        "webpage_url": f"https://www.youtube.com/watch?v={key:011d}",
+        "duration": "3:30",
+        "uploader": "Offline Uploader",
+        "thumbnail": f"https://i.ytimg.com/vi/{key:011d}/hqdefault.jpg",
+    }
+
+
+def workload(requests, catalogue, burst, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(catalogue)]
+    popular = rng.choices(range(catalogue), weights=weights, k=requests)
+    start = requests // 2
+    # A burst of one-off queries (e.g. a raid spamming /play) in the middle
+    return popular[:start] + list(range(catalogue, catalogue + burst)) + popular[start:]
+
+
+class LegacyCache:
+    """The old dict plus hourly truncation to the last 50 insertions"""
+
+    def __init__(self):
+        self.entries = {}
+        self.sizes = {}
+        self.bytes = 0
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self.entries[key] = value
+        self.sizes[key] = MusicBot.estimate_size(key) + MusicBot.estimate_size(value)
+        self.bytes += self.sizes[key]
+
+    def cleanup(self):
+        if len(self.entries) > 100:
+            keep = list(self.entries)[-50:]
+            self.entries = {key: self.entries[key] for key in keep}
+            self.sizes = {key: self.sizes[key] for key in keep}
+            self.bytes = sum(self.sizes.values())
+
+
+def replay(cache, keys, cleanup_every=None):
+    peak = 0
+    for i, key in enumerate(keys, 1):
+        if cache.get(key) is None:
+            cache.set(key, song_entry(key))
+        peak = max(peak, cache.bytes)
+        if cleanup_every and i % cleanup_every == 0:
+            cache.cleanup()
+    return cache.hits / (cache.hits + cache.misses), peak
+
+
+def main(args):
+    keys = workload(args.requests, args.catalogue, args.burst)
+    legacy_rate, legacy_peak = replay(LegacyCache(), keys, cleanup_every=args.requests_per_hour)
+    bounded = MusicBot.BoundedCache("songs", max_bytes=args.budget_kb * 1024, ttl=3 * 3600)
+    bounded_rate, bounded_peak = replay(bounded, keys)
+
+    print(f"{len(keys)} lookups, {args.catalogue} popular songs, burst of {args.burst} one-off queries")
+    print(f"{'policy':<26}{'hit rate':>10}{'peak KiB':>12}")
+    print(f"{'dict + hourly truncation':<26}{legacy_rate:>10.1%}{legacy_peak / 1024:>12.0f}")
+    print(f"{f'LRU, {args.budget_kb} KiB budget':<26}{bounded_rate:>10.1%}{bounded_peak / 1024:>12.0f}")
+    print(f"evictions: {bounded.evictions}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--catalogue", type=int, default=5000)
+    parser.add_argument("--burst", type=int, default=20000)
+    parser.add_argument("--requests-per-hour", type=int, default=20000,
+                        help="lookups between runs of the old hourly cleanup")
+    parser.add_argument("--budget-kb", type=int, default=8192, help="BoundedCache byte budget")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger("MusicBot").setLevel(logging.WARNING)
+    main(parse_args())
@@ -0,0 +1,270 @@
+"""Offline load test for the slash-command handlers.
+
+Drives ``play`` (and its autocomplete), ``search``, ``queue``, ``skip``,
+``weather``, ``forecast``, ``weather_vietnam``, ``ask`` and
+``city_autocomplete`` through fake interactions for a number of simulated
+guilds and reports throughput, latency percentiles, event-loop lag and
+memory per guild.
+
+    python -m benchmarks.bench_commands --guilds 1 100 1000
+
+Nothing leaves the machine: OpenWeather and Gemini are served by a local
+aiohttp stub and yt-dlp extraction is faked (see ``benchmarks/stubs.py``).
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from benchmarks import stubs  # must come first: sets the env vars MusicBot checks on import
+
+import discord
+import MusicBot
+
+SONG_CATALOGUE = [
+    "son tung mtp chung ta cua hien tai", "den vau mang tien ve cho me",
+    "hoa minzy bac bling", "my tam uoc gi", "vu that bai", "amee ung qua chung",
+    "mono waiting for you", "hieuthuhai khong the say", "obito dau ai dam",
+    "bich phuong bua yeu", "noo phuoc thinh", "erik em khong sai", "grey d vaicaday",
+    "tlinh nu hon bisou", "rhymastic yeu 5", "binz bigcityboi", "karik anh khong doi qua",
+    "phan manh quynh vo nguoi ta", "chillies mascara", "ngot em dao nay",
+]
+
+AUTOCOMPLETE_INPUTS = ["h", "ha", "da", "can", "nh", "vu", "bi", "ho chi", "", "lo"]
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a periodic sleeper"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def reset_state():
+    """Forget everything the bot learned in the previous scenario"""
+    MusicBot.music_player.guilds_data.clear()
+    MusicBot.music_player.stream_pool.streams.clear()
+    MusicBot.music_player.loudness_tasks.clear()
+    MusicBot.music_player.loudness_running.clear()
+    MusicBot.music_player.inflight_searches.clear()
+    for cache in MusicBot.cache_store.namespaces.values():
+        cache.clear()
+        cache.hits = cache.misses = cache.evictions = cache.expirations = 0
+    stubs.rest.reset()
+    stubs.FakeYoutubeDL.reset()
+    stubs.FakeAudioSource.reset()
+    stubs.FakeLoudnessProbe.reset()
+
+
+async def timed(latencies, name, coro):
+    start = time.perf_counter()
+    await coro
+    latencies[name].append(time.perf_counter() - start)
+
+
+async def populate_guild(guild, user, index):
+    """Start playback and queue a few songs, as an active guild would have"""
+    for offset in range(4):
+        query = SONG_CATALOGUE[(index + offset) % len(SONG_CATALOGUE)]
+        await MusicBot.play.callback(stubs.FakeInteraction(guild, user), query)
+
+
+async def type_query(guild, user, query, latencies, keystroke_gap=0.08):
+    """Send one autocomplete request per keystroke, like the Discord client does"""
+    pending = []
+    for end in range(1, len(query) + 1):
+        pending.append(asyncio.ensure_future(
+            MusicBot.song_autocomplete(stubs.FakeInteraction(guild, user), query[:end])
+        ))
+        if end < len(query):
+            await asyncio.sleep(keystroke_gap)
+    start = time.perf_counter()
+    await asyncio.gather(*pending)
+    latencies["play_autocomplete"].append(time.perf_counter() - start)
+
+
+async def guild_session(guild, user, index, rounds, latencies):
+    for r in range(rounds):
+        # A live version per round, so some plays miss the search cache
+        query = f"{SONG_CATALOGUE[(index * 7 + r) % len(SONG_CATALOGUE)]} live {r}"
+        city = MusicBot.VIETNAM_CITIES[(index + r) % len(MusicBot.VIETNAM_CITIES)]
+        typed = AUTOCOMPLETE_INPUTS[(index + r) % len(AUTOCOMPLETE_INPUTS)]
+
+        def interaction():
+            return stubs.FakeInteraction(guild, user)
+
+        await type_query(guild, user, query[:12], latencies)
+        await timed(latencies, "play", MusicBot.play.callback(interaction(), query))
+        await timed(latencies, "search", MusicBot.search.callback(interaction(), query))
+        await timed(latencies, "queue", MusicBot.queue_command.callback(interaction()))
+        await timed(latencies, "city_autocomplete", MusicBot.city_autocomplete(interaction(), typed))
+        await timed(latencies, "weather", MusicBot.weather.callback(interaction(), city))
+        await timed(latencies, "forecast", MusicBot.forecast.callback(interaction(), city))
+        await timed(latencies, "skip", MusicBot.skip.callback(interaction()))
+        await timed(latencies, "weather_vietnam", MusicBot.weather_vietnam.callback(interaction()))
+        await timed(latencies, "ask", MusicBot.ask_ai.callback(interaction(), f"cau hoi so {r}"))
+
+
+async def run_scenario(guild_count, rounds):
+    reset_state()
+    guilds = [stubs.FakeGuild(i) for i in range(guild_count)]
+    users = [stubs.FakeMember(guild, i) for i, guild in enumerate(guilds)]
+
+    # Memory: heap retained by the bot's per-guild state once every guild is active
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await asyncio.gather(*(
+        populate_guild(guild, user, i) for i, guild, user in zip(range(guild_count), guilds, users)
+    ))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    stubs.rest.reset()
+    latencies = defaultdict(list)
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        guild_session(guild, user, i, rounds, latencies)
+        for i, guild, user in zip(range(guild_count), guilds, users)
+    ))
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    # Let coalesced now-playing panel edits land before counting REST calls
+    await asyncio.sleep(MusicBot.music_player.now_playing_delay + 0.2)
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "guilds": guild_count,
+        "commands": total,
+        "seconds": elapsed,
+        "commands_per_sec": total / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            name: {
+                "p50": percentile(values, 50) * 1000,
+                "p99": percentile(values, 99) * 1000,
+            }
+            for name, values in sorted(latencies.items())
+        },
+        "loop_lag_ms": {
+            "p50": percentile(monitor.samples, 50) * 1000,
+            "p99": percentile(monitor.samples, 99) * 1000,
+            "max": max(monitor.samples, default=0.0) * 1000,
+        },
+        "memory_per_guild_kb": retained / guild_count / 1024,
+        "rest_calls": stubs.rest.total,
+        "channel_sends": stubs.rest.sends,
+        "channel_edits": stubs.rest.edits,
+        "tracks_started": stubs.rest.tracks,
+        "ffmpeg_processes": stubs.FakeAudioSource.spawned,
+        "normalized_tracks": stubs.FakeAudioSource.normalized,
+        "loudness_analyses": stubs.FakeLoudnessProbe.calls,
+        "caches": MusicBot.cache_store.stats(),
+        "extractions": stubs.FakeYoutubeDL.calls,
+        "flat_searches": stubs.FakeYoutubeDL.flat_calls,
+    }
+
+
+def print_report(result):
+    print(f"\n=== {result['guilds']} guild(s) ===")
+    print(f"commands         : {result['commands']} in {result['seconds']:.2f}s "
+          f"({result['commands_per_sec']:.1f} cmd/s)")
+    lag = result["loop_lag_ms"]
+    print(f"event-loop lag   : p50 {lag['p50']:.2f}ms  p99 {lag['p99']:.2f}ms  max {lag['max']:.2f}ms")
+    print(f"memory per guild : {result['memory_per_guild_kb']:.1f} KiB")
+    print(f"REST calls       : {result['rest_calls']} total, {result['channel_sends']} channel sends, "
+          f"{result['channel_edits']} edits for {result['tracks_started']} tracks")
+    print(f"yt-dlp           : {result['extractions']} extractions, {result['flat_searches']} flat searches, "
+          f"{result['ffmpeg_processes']} ffmpeg processes")
+    print(f"loudness         : {result['loudness_analyses']} analyses, "
+          f"{result['normalized_tracks']} of {result['ffmpeg_processes']} streams with measured gain")
+    print("caches           : " + ", ".join(
+        f"{name} {stats['hit_rate']:.0%} hits/{stats['bytes'] / 1024:.0f} KiB"
+        for name, stats in result["caches"].items()
+    ))
+    print(f"{'command':<18}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stats in result["latency_ms"].items():
+        print(f"{name:<18}{stats['p50']:>10.2f}{stats['p99']:>10.2f}")
+
+
+async def main(args):
+    stubs.FakeYoutubeDL.latency = args.extract_latency
+    stubs.FakeYoutubeDL.flat_latency = args.flat_latency
+    stubs.FakeLoudnessProbe.latency = args.loudness_latency
+    server = await stubs.StubServer(args.weather_latency, args.ai_latency).start()
+    server.point(MusicBot.weather_service, MusicBot.ai_service)
+    stubs.attach_bot(MusicBot.bot)
+
+    results = []
+    try:
+        for guild_count in args.guilds:
+            result = await run_scenario(guild_count, args.rounds)
+            results.append(result)
+            if not args.json:
+                print_report(result)
+    finally:
+        await server.close()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=3, help="command rounds per guild")
+    parser.add_argument("--extract-latency", type=float, default=0.05, help="seconds per full yt-dlp extraction")
+    parser.add_argument("--flat-latency", type=float, default=0.01, help="seconds per flat yt-dlp search")
+    parser.add_argument("--loudness-latency", type=float, default=2.0, help="seconds per loudness measurement")
+    parser.add_argument("--weather-latency", type=float, default=0.02, help="OpenWeather stub latency")
+    parser.add_argument("--ai-latency", type=float, default=0.1, help="Gemini stub latency")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(argv)
+
+
+def install_stubs():
+    MusicBot.yt_dlp.YoutubeDL = stubs.FakeYoutubeDL
+    discord.FFmpegPCMAudio = stubs.FakeAudioSource
+    discord.FFmpegOpusAudio = stubs.FakeAudioSource
+    MusicBot.music_player.measure_loudness = stubs.FakeLoudnessProbe.measure
+    MusicBot.logger.setLevel(logging.WARNING)
+
+
+if __name__ == "__main__":
+    install_stubs()
+    asyncio.run(main(parse_args()))
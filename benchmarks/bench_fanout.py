@@ -0,0 +1,144 @@
+"""Shared decode fan-out vs one ffmpeg encode per guild.
+
+Simulates many guilds playing the same track, joining a few seconds apart,
+and pulls 20ms frames the way discord.py's AudioPlayer does. ffmpeg is
+replaced by a fake Opus source, so the numbers are processes spawned and
+frames fetched/encoded (what costs CPU and bandwidth in production), the
+peak memory held in shared frame buffers and the Python-side cost per
+frame read. Before that, a threaded check stalls the fake ffmpeg and makes
+sure listeners behind it keep reading buffered frames.
+
+    python -m benchmarks.bench_fanout --guilds 1 10 100
+"""
+import argparse
+import logging
+import threading
+import time
+
+from benchmarks import stubs  # must come first: sets the env vars MusicBot checks on import
+
+import discord
+import MusicBot
+
+TRACK = "https://www.youtube.com/watch?v=radio000001"
+URL = "https://media.invalid/radio000001.webm"
+OPTIONS = {"before_options": "-reconnect 1", "options": "-vn"}
+
+
+def open_direct(pool):
+    return discord.FFmpegOpusAudio(URL, **OPTIONS)
+
+
+def open_shared(pool):
+    return pool.open(TRACK, URL, OPTIONS)
+
+
+class StallingAudioSource(stubs.FakeAudioSource):
+    """Fake ffmpeg that hangs on one read, like a stalled network fetch"""
+    stall_at = 100
+    stall_seconds = 1.0
+
+    def read(self):
+        if self.frames - self.remaining == self.stall_at:
+            time.sleep(self.stall_seconds)
+        return super().read()
+
+
+def check_stalled_producer():
+    """Time a lagging listener's buffered reads while the leader waits on ffmpeg"""
+    discord.FFmpegOpusAudio = StallingAudioSource
+    try:
+        pool = MusicBot.SharedStreamPool()
+        leader, lagging = open_shared(pool), open_shared(pool)
+        for _ in range(StallingAudioSource.stall_at):
+            leader.read()
+        stalled = threading.Thread(target=leader.read)
+        stalled.start()
+        time.sleep(0.1)  # let the leader get stuck inside the ffmpeg read
+
+        start = time.perf_counter()
+        for _ in range(StallingAudioSource.stall_at):
+            assert lagging.read(), "buffered frame missing"
+        waited = time.perf_counter() - start
+
+        stalled.join()
+        leader.cleanup()
+        lagging.cleanup()
+    finally:
+        discord.FFmpegOpusAudio = stubs.FakeAudioSource
+    assert waited < StallingAudioSource.stall_seconds / 2, f"buffered reads blocked for {waited:.2f}s"
+    return waited
+
+
+def simulate(open_source, guild_count, join_gap_frames, paused_guilds, pause_frames):
+    """Tick every listening guild once per 20ms frame until all finish"""
+    stubs.FakeAudioSource.reset()
+    pool = MusicBot.SharedStreamPool()
+    joins = {i: i * join_gap_frames for i in range(guild_count)}
+    paused = {i: (joins[i] + 500, joins[i] + 500 + pause_frames) for i in range(paused_guilds)}
+    sources = {}
+    finished = set()
+    reads = 0
+    read_time = 0.0
+    peak_bytes = 0
+    tick = 0
+    while len(finished) < guild_count:
+        for guild in range(guild_count):
+            if guild in finished or tick < joins[guild]:
+                continue
+            if guild not in sources:
+                sources[guild] = open_source(pool)
+            pause = paused.get(guild)
+            if pause and pause[0] <= tick < pause[1]:
+                continue
+            start = time.perf_counter()
+            data = sources[guild].read()
+            read_time += time.perf_counter() - start
+            reads += 1
+            if not data:
+                sources[guild].cleanup()
+                finished.add(guild)
+        if tick % 50 == 0:
+            peak_bytes = max(peak_bytes, pool.buffered_bytes())
+        tick += 1
+    return {
+        "processes": stubs.FakeAudioSource.spawned,
+        "frames_encoded": stubs.FakeAudioSource.frames_encoded,
+        "read_us": read_time / reads * 1e6,
+        "peak_buffer_kb": peak_bytes / 1024,
+        "open_streams": len(pool.streams),
+    }
+
+
+def main(args):
+    discord.FFmpegOpusAudio = stubs.FakeAudioSource
+    stubs.FakeAudioSource.frames = args.track_seconds * 50
+    join_gap = int(args.join_gap * 50)
+    waited = check_stalled_producer()
+    print(f"stalled ffmpeg read: lagging listener read {StallingAudioSource.stall_at} buffered frames "
+          f"in {waited * 1000:.2f}ms")
+    print(f"{args.track_seconds}s track, guilds join {args.join_gap}s apart, "
+          f"{args.paused} guild(s) pause for {args.pause}s")
+    print(f"{'guilds':>7}{'mode':>8}{'ffmpeg':>8}{'frames/guild':>14}{'buffer KiB':>12}{'read us':>10}")
+    for guild_count in args.guilds:
+        for name, open_source in (("direct", open_direct), ("shared", open_shared)):
+            result = simulate(open_source, guild_count, join_gap, min(args.paused, guild_count), args.pause * 50)
+            assert result["open_streams"] == 0
+            print(f"{guild_count:>7}{name:>8}{result['processes']:>8}"
+                  f"{result['frames_encoded'] / guild_count:>14.0f}{result['peak_buffer_kb']:>12.0f}"
+                  f"{result['read_us']:>10.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--track-seconds", type=int, default=180)
+    parser.add_argument("--join-gap", type=float, default=0.2, help="seconds between guilds starting the track")
+    parser.add_argument("--paused", type=int, default=1, help="guilds that pause longer than the buffer")
+    parser.add_argument("--pause", type=int, default=40, help="pause length in seconds")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger("MusicBot").setLevel(logging.WARNING)
+    main(parse_args())
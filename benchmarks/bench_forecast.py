@@ -0,0 +1,112 @@
+"""Forecast storage and daily aggregation: typed arrays vs dict-of-dicts.
+
+Builds forecasts for many cities from synthetic OpenWeather responses and
+compares the ``ForecastSeries`` arrays used by ``WeatherService`` with a
+naive per-point dict layout: retained memory, daily aggregation time and
+full embed render time.
+
+    python -m benchmarks.bench_forecast --cities 5000
+"""
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+from collections import defaultdict
+
+from benchmarks import stubs  # must come first: sets the env vars MusicBot checks on import
+
+import MusicBot
+
+
+def naive_from_api(data):
+    """One dict per point, keyed by timestamp"""
+    return {
+        "city": data["city"]["name"],
+        "timezone": data["city"].get("timezone", 0),
+        "points": {
+            point["dt"]: {
+                "temp": point["main"]["temp"],
+                "pop": point.get("pop", 0),
+                "icon": point["weather"][0]["icon"],
+            }
+            for point in data["list"]
+        },
+    }
+
+
+def naive_daily_summary(forecast):
+    """Same output as ``ForecastSeries.daily_summary``, grouped through dicts"""
+    grouped = defaultdict(list)
+    for timestamp, point in forecast["points"].items():
+        grouped[(timestamp + forecast["timezone"]) // 86400].append(point)
+    days = []
+    for day, points in sorted(grouped.items()):
+        temps = [point["temp"] for point in points]
+        icons = [point["icon"] for point in points if point["icon"].endswith("d")] or [points[0]["icon"]]
+        date = time.gmtime(day * 86400)
+        days.append(MusicBot.DailyForecast(
+            date=f"{date.tm_mday:02d}/{date.tm_mon:02d}",
+            weekday=date.tm_wday,
+            temp_min=round(min(temps), 1),
+            temp_max=round(max(temps), 1),
+            temp_mean=round(sum(temps) / len(temps), 1),
+            rain_probability=round(max(point["pop"] for point in points) * 100),
+            icon=icons[0],
+        ))
+    return days
+
+
+def measure(build, payloads):
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    forecasts = [build(payload) for payload in payloads]
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return forecasts, retained
+
+
+def timed(function, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            function(item)
+    return (time.perf_counter() - start) / (repeat * len(items))
+
+
+def main(args):
+    payloads = [stubs.forecast_payload(f"City {i}") for i in range(args.cities)]
+    compact, compact_bytes = measure(MusicBot.ForecastSeries.from_api, payloads)
+    naive, naive_bytes = measure(naive_from_api, payloads)
+
+    # Same days for every city, up to float32 rounding of the stored temperatures
+    for series, forecast in zip(compact, naive, strict=True):
+        for day, expected in zip(series.daily_summary(), naive_daily_summary(forecast), strict=True):
+            for field in ("date", "weekday", "rain_probability", "icon"):
+                assert getattr(day, field) == getattr(expected, field), field
+            for field in ("temp_min", "temp_max", "temp_mean"):
+                assert abs(getattr(day, field) - getattr(expected, field)) <= 0.1, field
+
+    compact_agg = timed(MusicBot.ForecastSeries.daily_summary, compact, args.repeat)
+    naive_agg = timed(naive_daily_summary, naive, args.repeat)
+    render = timed(MusicBot.weather_service.create_forecast_embed, compact, args.repeat)
+
+    print(f"{args.cities} cities x 40 points")
+    print(f"{'layout':<14}{'KiB/city':>10}{'aggregate us':>14}")
+    print(f"{'typed arrays':<14}{compact_bytes / args.cities / 1024:>10.2f}{compact_agg * 1e6:>14.1f}")
+    print(f"{'dict-of-dicts':<14}{naive_bytes / args.cities / 1024:>10.2f}{naive_agg * 1e6:>14.1f}")
+    print(f"\nembed render (aggregate + embed): {render * 1e6:.1f} us per city")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cities", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger("MusicBot").setLevel(logging.WARNING)
+    main(parse_args())
@@ -0,0 +1,193 @@
+"""Offline comparison of the default and lean gateway modes.
+
+Feeds synthetic GUILD_CREATE and GUILD_MEMBERS_CHUNK payloads through
+discord.py's real connection state, so member parsing and caching cost
+what they would in production. Only the gateway round trip of a chunk
+request is simulated (``--chunk-rtt``). Each mode runs in its own
+process so resident memory is not shared between them.
+
+    python -m benchmarks.bench_gateway --guilds 20 --members 5000
+
+Also replays a join raid against ``MemberAnnouncer`` to compare the
+number of system channel messages with and without the digest window.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from benchmarks import stubs  # must come first: sets the env vars MusicBot checks on import
+
+from discord.ext import commands
+import MusicBot
+
+CHUNK_SIZE = 1000
+
+
+def member_payload(user_id):
+    return {
+        "user": {
+            "id": str(user_id),
+            "username": f"member{user_id}",
+            "global_name": f"Member {user_id}",
+            "discriminator": "0",
+            "avatar": None,
+        },
+        "roles": [],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(guild_id, member_count, bot_id, voice_members):
+    # Large guilds only ship the bot itself and members in voice in GUILD_CREATE
+    members = [member_payload(bot_id)] + [member_payload(guild_id + i) for i in range(1, voice_members + 1)]
+    voice_channel_id = guild_id + member_count + 1
+    return {
+        "id": str(guild_id),
+        "name": f"Guild {guild_id}",
+        "owner_id": str(guild_id + 1),
+        "member_count": member_count,
+        "large": member_count >= 250,
+        "roles": [{
+            "id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0,
+            "color": 0, "hoist": False, "managed": False, "mentionable": False,
+        }],
+        "channels": [{
+            "id": str(voice_channel_id), "type": 2, "name": "Music", "position": 0,
+            "permission_overwrites": [], "bitrate": 64000, "user_limit": 0,
+        }],
+        "members": members,
+        "voice_states": [
+            {
+                "user_id": str(guild_id + i), "channel_id": str(voice_channel_id), "session_id": "x",
+                "deaf": False, "mute": False, "self_deaf": False, "self_mute": False,
+                "self_video": False, "suppress": False,
+            }
+            for i in range(1, voice_members + 1)
+        ],
+        "presences": [],
+        "threads": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "premium_tier": 0,
+    }
+
+
+async def run_mode(lean, guild_count, member_count, chunk_rtt):
+    """Connect a bot to synthetic guilds and wait until it would be ready"""
+    base_rss = MusicBot.resident_memory_mb()
+    bot = commands.Bot(command_prefix="!", intents=MusicBot.intents, **MusicBot.gateway_options(lean))
+    state = bot._connection
+    bot.loop = state.loop = asyncio.get_running_loop()
+    bot_id = 1
+    state.user = SimpleNamespace(id=bot_id)
+
+    guild_ids = [10**12 + i * 10**7 for i in range(guild_count)]
+
+    async def chunker(guild_id, query="", limit=0, presences=False, *, nonce=None):
+        # Stands in for REQUEST_GUILD_MEMBERS; discord.py parses the chunks for real
+        async def deliver():
+            await asyncio.sleep(chunk_rtt)
+            chunk_count = -(-member_count // CHUNK_SIZE)
+            for index in range(chunk_count):
+                first = guild_id + index * CHUNK_SIZE + 1
+                last = min(guild_id + member_count, first + CHUNK_SIZE - 1)
+                state.parse_guild_members_chunk({
+                    "guild_id": str(guild_id),
+                    "members": [member_payload(user_id) for user_id in range(first, last + 1)],
+                    "chunk_index": index,
+                    "chunk_count": chunk_count,
+                    "nonce": nonce,
+                })
+                await asyncio.sleep(0)
+        asyncio.create_task(deliver())
+
+    state.chunker = chunker
+
+    start = time.perf_counter()
+    for guild_id in guild_ids:
+        state.parse_guild_create(guild_payload(guild_id, member_count, bot_id, voice_members=5))
+        await asyncio.sleep(0)
+    while state._chunk_requests:
+        await asyncio.sleep(0.001)
+    ready = time.perf_counter() - start
+
+    gc.collect()
+    rss = MusicBot.resident_memory_mb()
+    cached_members = sum(len(guild._members) for guild in bot.guilds)
+    return {
+        "mode": "lean" if lean else "default",
+        "guilds": guild_count,
+        "members_per_guild": member_count,
+        "time_to_ready_s": ready,
+        "cached_members": cached_members,
+        "cached_users": len(state._users),
+        "rss_delta_mb": (rss - base_rss) if rss is not None and base_rss is not None else None,
+    }
+
+
+async def join_raid(window, joins):
+    """Count system channel messages for a burst of joins in one guild"""
+    announcer = MusicBot.MemberAnnouncer(window)
+    guild = stubs.FakeGuild(0)
+    stubs.rest.reset()
+    for i in range(joins):
+        await announcer.member_joined(stubs.FakeMember(guild, i))
+    if window > 0:
+        await asyncio.sleep(window + 0.05)
+    return stubs.rest.sends
+
+
+def run_child(args, lean):
+    command = [
+        sys.executable, "-m", "benchmarks.bench_gateway", "--child", "lean" if lean else "default",
+        "--guilds", str(args.guilds), "--members", str(args.members), "--chunk-rtt", str(args.chunk_rtt),
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    if args.child:
+        result = asyncio.run(run_mode(args.child == "lean", args.guilds, args.members, args.chunk_rtt))
+        print(json.dumps(result))
+        return
+
+    results = [run_child(args, lean=False), run_child(args, lean=True)]
+    print(f"{args.guilds} guilds x {args.members} members, chunk RTT {args.chunk_rtt * 1000:.0f}ms")
+    print(f"{'mode':<10}{'ready s':>10}{'RSS +MB':>10}{'members':>10}{'users':>10}")
+    for result in results:
+        rss = result["rss_delta_mb"]
+        print(f"{result['mode']:<10}{result['time_to_ready_s']:>10.2f}"
+              f"{(f'{rss:.1f}' if rss is not None else 'n/a'):>10}"
+              f"{result['cached_members']:>10}{result['cached_users']:>10}")
+
+    window = 0.2
+    immediate = asyncio.run(join_raid(0, args.raid))
+    batched = asyncio.run(join_raid(window, args.raid))
+    print(f"\njoin raid of {args.raid}: {immediate} messages without digest, "
+          f"{batched} with a {window}s digest window")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--members", type=int, default=5000, help="members per guild")
+    parser.add_argument("--chunk-rtt", type=float, default=0.05, help="simulated chunk request round trip")
+    parser.add_argument("--raid", type=int, default=200, help="joins in the simulated raid")
+    parser.add_argument("--child", choices=["default", "lean"], help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger("MusicBot").setLevel(logging.WARNING)
+    main(parse_args())
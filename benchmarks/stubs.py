@@ -0,0 +1,439 @@
+"""Offline stand-ins for Discord, yt-dlp, OpenWeather and Gemini.
+
+Everything here runs locally: HTTP services are served by an aiohttp
+stub server on 127.0.0.1 and yt-dlp extraction is replaced by a fake
+``YoutubeDL`` that sleeps for a configurable time instead of hitting
+the network.
+"""
+import asyncio
+import itertools
+import os
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+
+# MusicBot validates these at import time; the values are never sent anywhere
+for _var in ("DISCORD_TOKEN", "OPENWEATHER_API_KEY", "GEMINI_API_KEY"):
+    os.environ.setdefault(_var, "offline-benchmark")
+
+_ids = itertools.count(1_000_000)
+
+
+class RestCounter:
+    """Counts the REST calls the bot would have made to Discord.
+
+    ``sends`` and ``edits`` hit channel routes and their rate limits;
+    ``responses`` are interaction responses and followups.
+    """
+    def __init__(self):
+        self.reset()
+
+    @property
+    def total(self):
+        return self.sends + self.edits + self.responses
+
+    def reset(self):
+        self.sends = 0
+        self.edits = 0
+        self.responses = 0
+        self.tracks = 0
+
+
+rest = RestCounter()
+
+
+# ---------------------------------------------------------------------------
+# Discord objects
+# ---------------------------------------------------------------------------
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None, view=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+
+    async def edit(self, **kwargs):
+        rest.edits += 1
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        return self
+
+    async def delete(self):
+        rest.edits += 1
+
+
+class FakeTextChannel:
+    def __init__(self, guild):
+        self.id = next(_ids)
+        self.guild = guild
+        self.messages = 0
+
+    async def send(self, content=None, *, embed=None, view=None, **kwargs):
+        rest.sends += 1
+        self.messages += 1
+        return FakeMessage(self, content, embed, view)
+
+
+class FakeAudioSource:
+    """Replaces the ffmpeg audio sources so no ffmpeg process is spawned.
+
+    Each instance stands for one ffmpeg process fetching and encoding the
+    track; ``frames`` is the track length in 20ms Opus frames, each
+    ``frame_size`` bytes (about 128 kbit/s).
+    """
+    frames = 3000
+    frame_size = 320
+    spawned = 0
+    normalized = 0
+    frames_encoded = 0
+
+    def __init__(self, source, **kwargs):
+        type(self).spawned += 1
+        if 'dB"' in (kwargs.get("options") or ""):
+            type(self).normalized += 1
+        self.source = source
+        self.kwargs = kwargs
+        self.remaining = self.frames
+        before = kwargs.get("before_options") or ""
+        if before.startswith("-ss "):
+            self.remaining -= int(float(before.split()[1]) * 50)
+
+    @classmethod
+    def reset(cls):
+        cls.spawned = 0
+        cls.normalized = 0
+        cls.frames_encoded = 0
+
+    def read(self):
+        if self.remaining <= 0:
+            return b""
+        self.remaining -= 1
+        type(self).frames_encoded += 1
+        return bytes(self.frame_size)
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        pass
+
+
+class FakeVoiceClient:
+    def __init__(self, guild, channel):
+        self.guild = guild
+        self.channel = channel
+        self._connected = True
+        self._playing = False
+        self._paused = False
+        self._after = None
+        self.source = None
+
+    def is_connected(self):
+        return self._connected
+
+    def is_playing(self):
+        return self._playing
+
+    def is_paused(self):
+        return self._paused
+
+    def play(self, source, *, after=None, **kwargs):
+        rest.tracks += 1
+        self.source = source
+        self._after = after
+        self._playing = True
+
+    def stop(self):
+        # discord.py calls ``after`` from the player thread once playback ends
+        was_playing = self._playing or self._paused
+        self._playing = self._paused = False
+        after, self._after = self._after, None
+        if was_playing:
+            # AudioPlayer calls ``after`` first and cleans up the source afterwards
+            if after:
+                after(None)
+            self.source.cleanup()
+
+    def pause(self):
+        if self._playing:
+            self._playing = False
+            self._paused = True
+
+    def resume(self):
+        if self._paused:
+            self._paused = False
+            self._playing = True
+
+    async def disconnect(self, *, force=False):
+        self.stop()
+        self._connected = False
+        self.guild.voice_client = None
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild):
+        self.id = next(_ids)
+        self.guild = guild
+
+    async def connect(self, **kwargs):
+        self.guild.voice_client = FakeVoiceClient(self.guild, self)
+        return self.guild.voice_client
+
+
+class FakeGuild:
+    def __init__(self, index):
+        self.id = next(_ids)
+        self.name = f"Guild {index}"
+        self.voice_client = None
+        self.text_channel = FakeTextChannel(self)
+        self.voice_channel = FakeVoiceChannel(self)
+        self.system_channel = self.text_channel
+
+
+class FakeMember:
+    def __init__(self, guild, index=0, in_voice=True):
+        self.id = next(_ids)
+        self.guild = guild
+        self.display_name = f"user{index}"
+        self.name = self.display_name
+        self.mention = f"<@{self.id}>"
+        self.avatar = None
+        self.default_avatar = SimpleNamespace(url="https://cdn.invalid/avatar.png")
+        self.voice = SimpleNamespace(channel=guild.voice_channel) if in_voice else None
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        rest.responses += 1
+        self._done = True
+
+    async def edit_message(self, **kwargs):
+        rest.responses += 1
+        self._done = True
+
+    async def autocomplete(self, choices):
+        self._done = True
+
+
+class FakeFollowup:
+    async def send(self, content=None, **kwargs):
+        rest.responses += 1
+        return FakeMessage(None, content, kwargs.get("embed"), kwargs.get("view"))
+
+
+class FakeInteraction:
+    def __init__(self, guild, user):
+        self.id = next(_ids)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = guild.text_channel
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+    async def edit_original_response(self, **kwargs):
+        rest.responses += 1
+
+
+def attach_bot(bot):
+    """Give an unconnected bot the loop and user it would have after login"""
+    bot.loop = asyncio.get_running_loop()
+    bot._connection.user = SimpleNamespace(
+        id=next(_ids), name="bot", display_name="bot", avatar=None
+    )
+
+
+# ---------------------------------------------------------------------------
+# yt-dlp
+# ---------------------------------------------------------------------------
+
+class FakeYoutubeDL:
+    """Drop-in for ``yt_dlp.YoutubeDL`` that fabricates extraction results.
+
+    ``latency`` is the blocking time of a full extraction (formats and
+    signatures resolved); ``flat_latency`` the time of an ``extract_flat``
+    search.
+    """
+    latency = 0.05
+    flat_latency = 0.01
+    calls = 0
+    flat_calls = 0
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @classmethod
+    def reset(cls):
+        cls.calls = 0
+        cls.flat_calls = 0
+
+    @staticmethod
+    def _entry(video_id, title):
+        return {
+            "id": video_id,
+            "title": title,
+            "url": f"https://media.invalid/{video_id}.webm",
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+            "duration": 180 + len(title),
+            "uploader": "Offline Uploader",
+            "thumbnail": f"https://i.invalid/{video_id}.jpg",
+        }
+
+    def extract_info(self, query, download=False, **kwargs):
+        flat = bool(self.params.get("extract_flat"))
+        if flat:
+            type(self).flat_calls += 1
+            time.sleep(self.flat_latency)
+        else:
+            type(self).calls += 1
+            time.sleep(self.latency)
+
+        if query.startswith("ytsearch"):
+            prefix, _, terms = query.partition(":")
+            count = int(prefix[len("ytsearch"):] or 1)
+            entries = []
+            for i in range(count):
+                video_id = f"{abs(hash((terms, i))) % 10**11:011d}"
+                entry = self._entry(video_id, f"{terms} #{i + 1}")
+                if flat:
+                    entry = {
+                        "id": video_id,
+                        "title": entry["title"],
+                        "url": entry["webpage_url"],
+                        "duration": entry["duration"],
+                        "uploader": entry["uploader"],
+                    }
+                entries.append(entry)
+            return {"_type": "playlist", "entries": entries}
+
+        video_id = query.rsplit("=", 1)[-1][-11:]
+        return self._entry(video_id, f"Video {video_id}")
+
+
+class FakeLoudnessProbe:
+    """Replaces the ffmpeg ebur128 pass with a fixed-time fake measurement"""
+    latency = 0.2
+    calls = 0
+
+    @classmethod
+    def reset(cls):
+        cls.calls = 0
+
+    @classmethod
+    async def measure(cls, url):
+        cls.calls += 1
+        await asyncio.sleep(cls.latency)
+        seed = sum(map(ord, url))
+        return -8.0 - seed % 16, -0.5 - seed % 4
+
+
+# ---------------------------------------------------------------------------
+# HTTP services
+# ---------------------------------------------------------------------------
+
+def forecast_payload(city, start=1_760_000_000, points=40):
+    """OpenWeather 5-day/3-hour response with a deterministic daily cycle"""
+    seed = sum(map(ord, city))
+    entries = []
+    for i in range(points):
+        hour = (i * 3 + 7) % 24
+        daytime = 6 <= hour < 18
+        entries.append({
+            "dt": start + i * 10800,
+            "main": {
+                "temp": 24 + seed % 6 + (6 if daytime else 0) - abs(hour - 14) * 0.3,
+                "feels_like": 27 + seed % 6,
+                "temp_min": 23.0,
+                "temp_max": 33.0,
+                "humidity": 70 + (seed + i) % 20,
+            },
+            "weather": [{"description": "light rain", "icon": "10d" if daytime else "10n"}],
+            "wind": {"speed": 3.1},
+            "pop": ((seed + i * 7) % 100) / 100,
+            "dt_txt": "",
+        })
+    return {"cnt": points, "list": entries, "city": {"name": city, "timezone": 25200, "country": "VN"}}
+
+
+class StubServer:
+    """Local OpenWeather and Gemini replacement with configurable latency"""
+
+    def __init__(self, weather_latency=0.02, ai_latency=0.1):
+        self.weather_latency = weather_latency
+        self.ai_latency = ai_latency
+        self.requests = 0
+        self._runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/data/2.5/weather", self._weather)
+        app.router.add_get("/data/2.5/forecast", self._forecast)
+        app.router.add_post("/v1beta/models/{model}", self._gemini)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0, backlog=4096)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def point(self, weather_service, ai_service):
+        """Redirect the bot's services to this server"""
+        weather_service.base_url = f"{self.url}/data/2.5"
+        ai_service.base_url = f"{self.url}/v1beta/models/gemini-2.0-flash-exp:generateContent"
+
+    async def _weather(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.weather_latency)
+        city = request.query.get("q", "Hanoi").split(",")[0]
+        seed = sum(map(ord, city))
+        return web.json_response({
+            "name": city,
+            "main": {
+                "temp": 24 + seed % 10,
+                "feels_like": 26 + seed % 10,
+                "humidity": 60 + seed % 30,
+            },
+            "weather": [{"description": "scattered clouds", "icon": "03d"}],
+            "wind": {"speed": 2.5 + seed % 5},
+        })
+
+    async def _forecast(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.weather_latency)
+        city = request.query.get("q", "Hanoi").split(",")[0]
+        return web.json_response(forecast_payload(city))
+
+    async def _gemini(self, request):
+        self.requests += 1
+        await request.read()
+        await asyncio.sleep(self.ai_latency)
+        return web.json_response({
+            "candidates": [{"content": {"parts": [{"text": "Xin chào! " * 20}]}}]
+        })